@@ -1,9 +1,29 @@
+import numpy as np
 import pandas as pd
-import joblib
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, roc_auc_score
 
+
+def fit_logistic_regression(X, y, max_iter=100, tol=1e-8, l2=1e-6):
+    """Newton/IRLS logistic regression — vectorized NumPy, no Python loops
+    over samples. Returns (coef, intercept) arrays directly."""
+    n, d = X.shape
+    Xb = np.hstack([X, np.ones((n, 1))])
+    w = np.zeros(d + 1)
+
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-(Xb @ w)))
+        grad = Xb.T @ (p - y) + l2 * w
+        s = np.maximum(p * (1.0 - p), 1e-12)
+        hess = (Xb.T * s) @ Xb + l2 * np.eye(d + 1)
+        step = np.linalg.solve(hess, grad)
+        w -= step
+        if np.abs(step).max() < tol:
+            break
+
+    return w[:-1], w[-1]
+
+
 # 1. Load dataset
 df = pd.read_csv("dataset/phase3_features.csv")
 
@@ -27,19 +47,20 @@ X_train, X_test, y_train, y_test = train_test_split(
 )
 
 # 5. Train model
-model = LogisticRegression(max_iter=1000)
-model.fit(X_train, y_train)
+coef, intercept = fit_logistic_regression(
+    X_train.to_numpy(dtype=np.float64),
+    y_train.to_numpy(dtype=np.float64),
+)
 
 # 6. Evaluate
-y_prob = model.predict_proba(X_test)[:, 1]
-print(classification_report(y_test, model.predict(X_test)))
+y_prob = 1.0 / (1.0 + np.exp(-(X_test.to_numpy(dtype=np.float64) @ coef + intercept)))
+print(classification_report(y_test, (y_prob >= 0.5).astype(int)))
 print("ROC AUC:", roc_auc_score(y_test, y_prob))
 
-# 7. Save model artifact
-joblib.dump(
-    {
-        "model": model,
-        "feature_names": feature_names,
-    },
-    "experiments/models/failure_risk_model.joblib"
+# 7. Save model artifact (raw weights — the gateway only needs the dot product)
+np.savez(
+    "experiments/models/failure_risk_model.npz",
+    coef=coef,
+    intercept=np.atleast_1d(intercept),
+    feature_names=np.array(feature_names),
 )
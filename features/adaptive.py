@@ -10,28 +10,23 @@ class AdaptiveThresholdController:
         self.max = max_threshold
 
     def compute_threshold(self, features: dict) -> float:
-        threshold = self.base
-
         if not features:
-            return threshold
-
-        # High retry pressure → lower tolerance
-        if features.get("retry_rate", 0) > 0.3:
-            threshold -= 0.10
-
-        # Latency rising → act earlier
-        if features.get("latency_slope", 0) > 0:
-            threshold -= 0.10
+            return self.base
 
-        # Circuit instability → defensive mode
-        if features.get("circuit_flap_rate", 0) > 0:
-            threshold -= 0.15
+        retry_rate = features.get("retry_rate", 0.0)
+        latency_slope = features.get("latency_slope", 0.0)
+        flap_rate = features.get("circuit_flap_rate", 0.0)
+        failure_ratio = features.get("failure_ratio", 0.0)
 
-        # Very stable → be conservative
-        if (
-            features.get("failure_ratio", 0) == 0
-            and features.get("latency_slope", 0) <= 0
-        ):
-            threshold += 0.10
+        # Branchless: booleans scale the deltas directly.
+        # High retry pressure / rising latency / circuit instability lower
+        # the threshold; a fully stable window raises it.
+        delta = (
+            -0.10 * (retry_rate > 0.3)
+            - 0.10 * (latency_slope > 0)
+            - 0.15 * (flap_rate > 0)
+            + 0.10 * ((failure_ratio == 0) & (latency_slope <= 0))
+        )
 
+        threshold = self.base + delta
         return max(self.min, min(self.max, round(threshold, 2)))
@@ -1,6 +1,4 @@
-import asyncio
-import statistics
-from collections import deque
+import numpy as np
 from prometheus_client import REGISTRY
 
 # Hard cap to keep features finite & JSON-safe
@@ -31,62 +29,95 @@ class FeatureExtractor:
         self.window_size = window_size
         self.sample_interval = sample_interval
 
-        # Sliding windows
-        self.total = deque(maxlen=window_size)
-        self.failures = deque(maxlen=window_size)
-        self.timeouts = deque(maxlen=window_size)
-        self.retries = deque(maxlen=window_size)
-        self.latency_p95 = deque(maxlen=window_size)
-        self.circuit_flaps = deque(maxlen=window_size)
+        # Only these metrics are scanned when walking the registry
+        self._counter_names = frozenset({
+            self.request_total,
+            self.request_failures,
+            self.request_timeouts,
+            self.request_retries,
+            self.circuit_transitions,
+        })
+        self._tracked = self._counter_names | {self.latency_histogram}
+
+        # Sliding windows (preallocated ring buffers, shared write cursor)
+        self.total = np.zeros(window_size)
+        self.failures = np.zeros(window_size)
+        self.timeouts = np.zeros(window_size)
+        self.retries = np.zeros(window_size)
+        self.latency_p95 = np.zeros(window_size)
+        self.circuit_flaps = np.zeros(window_size)
+
+        self._idx = 0
+        self._filled = 0
 
         # Delta tracking
         self._last = {}
 
+        # Histogram bucket edges are static — cached on first sight
+        self._bucket_le = None
+        self._bucket_pos = None
+
         # ✅ CRITICAL: cache last valid feature vector
         self._last_features = {}
 
-    async def start(self):
-        while True:
-            self.snapshot()
-            await asyncio.sleep(self.sample_interval)
+        # Features only change when a snapshot lands — memoize per snapshot
+        self._snapshot_id = 0
+        self._cached_id = -1
 
     # ---------- Prometheus helpers ----------
-    def _counter_value(self, metric_name: str) -> float:
-        total = 0.0
-        for metric in REGISTRY.collect():
-            if metric.name == metric_name:
-                for sample in metric.samples:
-                    total += sample.value
-        return total
-
-    def _histogram_p95(self, metric_name: str) -> float:
+    def _collect_tracked(self):
+        """Single pass over the registry: counter totals + histogram buckets."""
+        counters = {name: 0.0 for name in self._counter_names}
         buckets = []
+
         for metric in REGISTRY.collect():
-            if metric.name == metric_name:
+            if metric.name not in self._tracked:
+                continue
+
+            if metric.name == self.latency_histogram:
                 for sample in metric.samples:
                     if sample.name.endswith("_bucket"):
                         buckets.append((sample.labels.get("le"), sample.value))
+            else:
+                total = 0.0
+                for sample in metric.samples:
+                    total += sample.value
+                counters[metric.name] = total
 
+        return counters, buckets
+
+    def _histogram_p95(self, buckets) -> float:
         if not buckets:
             return 0.0
 
-        buckets.sort(
-            key=lambda x: float("inf") if x[0] == "+Inf" else float(x[0])
-        )
-
-        total = buckets[-1][1]
+        if self._bucket_pos is None:
+            # Sort the edges once; later calls only fill counts by position
+            les = {le for le, _ in buckets}
+            edges = sorted(
+                float("inf") if le == "+Inf" else float(le) for le in les
+            )
+            self._bucket_le = np.array(edges)
+            self._bucket_pos = {
+                le: int(np.searchsorted(
+                    edges, float("inf") if le == "+Inf" else float(le)
+                ))
+                for le in les
+            }
+
+        counts = np.zeros(len(self._bucket_le))
+        for le, value in buckets:
+            counts[self._bucket_pos[le]] += value
+
+        total = counts[-1]
         if total == 0:
             return 0.0
 
-        threshold = total * 0.95
-
-        for le, count in buckets:
-            if count >= threshold:
-                if le == "+Inf":
-                    return MAX_LATENCY_MS
-                return float(le)
-
-        return 0.0
+        # Bucket counts are cumulative, so the p95 bucket is a bisection
+        idx = int(np.searchsorted(counts, total * 0.95))
+        le = self._bucket_le[idx]
+        if le == float("inf"):
+            return MAX_LATENCY_MS
+        return float(le)
 
     def _delta(self, name, current):
         prev = self._last.get(name, current)
@@ -95,62 +126,82 @@ class FeatureExtractor:
 
     # ---------- Snapshot ----------
     def snapshot(self):
-        total = self._delta("total", self._counter_value(self.request_total))
-        failures = self._delta("failures", self._counter_value(self.request_failures))
-        timeouts = self._delta("timeouts", self._counter_value(self.request_timeouts))
-        retries = self._delta("retries", self._counter_value(self.request_retries))
-        flaps = self._delta("flaps", self._counter_value(self.circuit_transitions))
+        counters, buckets = self._collect_tracked()
+
+        total = self._delta("total", counters[self.request_total])
+        failures = self._delta("failures", counters[self.request_failures])
+        timeouts = self._delta("timeouts", counters[self.request_timeouts])
+        retries = self._delta("retries", counters[self.request_retries])
+        flaps = self._delta("flaps", counters[self.circuit_transitions])
 
-        p95 = self._histogram_p95(self.latency_histogram)
+        p95 = self._histogram_p95(buckets)
 
-        self.total.append(total)
-        self.failures.append(failures)
-        self.timeouts.append(timeouts)
-        self.retries.append(retries)
-        self.latency_p95.append(p95)
-        self.circuit_flaps.append(flaps)
+        idx = self._idx
+        self.total[idx] = total
+        self.failures[idx] = failures
+        self.timeouts[idx] = timeouts
+        self.retries[idx] = retries
+        self.latency_p95[idx] = p95
+        self.circuit_flaps[idx] = flaps
+
+        self._idx = (idx + 1) % self.window_size
+        self._filled = min(self._filled + 1, self.window_size)
+        self._snapshot_id += 1
 
     # ---------- Feature computation ----------
     def compute_features(self) -> dict:
+        # Nothing sampled since the last call → cached dict is still valid
+        if self._snapshot_id == self._cached_id:
+            return self._last_features
+
         # ✅ Never return empty features after warm-up
-        if sum(self.total) == 0:
+        total = float(self.total.sum())
+        if total == 0:
+            self._cached_id = self._snapshot_id
             return self._last_features
 
-        failure_ratio = sum(self.failures) / sum(self.total)
-        timeout_rate = sum(self.timeouts) / sum(self.total)
-        retry_rate = sum(self.retries) / sum(self.total)
+        failure_ratio = float(self.failures.sum()) / total
+        timeout_rate = float(self.timeouts.sum()) / total
+        retry_rate = float(self.retries.sum()) / total
 
         features = {
             "failure_ratio": round(failure_ratio, 4),
             "failure_ratio_slope": round(self._slope(self.failures), 4),
-            "p95_latency": round(self.latency_p95[-1], 2)
-            if self.latency_p95
+            "p95_latency": round(self._newest(self.latency_p95), 2)
+            if self._filled
             else 0.0,
             "latency_slope": round(self._slope(self.latency_p95), 2),
             "retry_rate": round(retry_rate, 4),
             "timeout_rate": round(timeout_rate, 4),
             "error_burstiness": round(self._burstiness(self.failures), 2),
             "circuit_flap_rate": round(
-                sum(self.circuit_flaps) / self.window_size, 4
+                float(self.circuit_flaps.sum()) / self.window_size, 4
             ),
         }
 
         # ✅ Cache last valid snapshot
         self._last_features = features
+        self._cached_id = self._snapshot_id
         return features
 
-    def _slope(self, values):
-        if len(values) < 2:
-            return 0.0
-        v0, v1 = values[0], values[-1]
-        if not isinstance(v0, (int, float)) or not isinstance(v1, (int, float)):
+    def _newest(self, buf):
+        return float(buf[(self._idx - 1) % self.window_size])
+
+    def _oldest(self, buf):
+        if self._filled < self.window_size:
+            return float(buf[0])
+        return float(buf[self._idx])
+
+    def _slope(self, buf):
+        if self._filled < 2:
             return 0.0
-        return (v1 - v0) / len(values)
+        return (self._newest(buf) - self._oldest(buf)) / self._filled
 
-    def _burstiness(self, values):
-        if len(values) < 2:
+    def _burstiness(self, buf):
+        if self._filled < 2:
             return 0.0
-        mean = statistics.mean(values)
+        window = buf[: self._filled]
+        mean = window.mean()
         if mean == 0:
             return 0.0
-        return statistics.stdev(values) / mean
+        return float(window.std(ddof=1) / mean)
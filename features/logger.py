@@ -1,8 +1,8 @@
-import asyncio
+import atexit
 import csv
 import os
 import time
-from typing import Dict
+from collections import deque
 
 
 class FeatureLogger:
@@ -14,39 +14,47 @@ class FeatureLogger:
         log_interval=5,
         failure_threshold=0.5,
         label_window=30,
+        flush_rows=64,
+        flush_interval=5,
     ):
         self.extractor = extractor
         self.output_path = output_path
         self.log_interval = log_interval
         self.failure_threshold = failure_threshold
         self.label_window = label_window
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
 
-        self._buffer = []
+        self._buffer = deque()
+        self._pending = []
+        self._last_flush = time.time()
 
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        if not os.path.exists(output_path):
-            with open(output_path, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    "timestamp",
-                    "failure_ratio",
-                    "failure_ratio_slope",
-                    "p95_latency",
-                    "latency_slope",
-                    "retry_rate",
-                    "timeout_rate",
-                    "error_burstiness",
-                    "circuit_flap_rate",
-                    "label_failure_next_30s",
-                ])
+        write_header = not os.path.exists(output_path)
 
-    async def start(self):
-        while True:
-            self._log_once()
-            await asyncio.sleep(self.log_interval)
+        # Keep the handle open for the process lifetime — one open() total
+        # instead of one per log cycle.
+        self._fh = open(output_path, "a", newline="")
+        self._writer = csv.writer(self._fh)
+        atexit.register(self.close)
 
-    def _log_once(self):
+        if write_header:
+            self._writer.writerow([
+                "timestamp",
+                "failure_ratio",
+                "failure_ratio_slope",
+                "p95_latency",
+                "latency_slope",
+                "retry_rate",
+                "timeout_rate",
+                "error_burstiness",
+                "circuit_flap_rate",
+                "label_failure_next_30s",
+            ])
+            self._fh.flush()
+
+    def log_once(self):
         features = self.extractor.compute_features()
         if not features:
             return
@@ -56,33 +64,41 @@ class FeatureLogger:
         # Store temporarily to label later
         self._buffer.append((now, features))
 
-        # Assign labels to old samples
+        # Label samples old enough to have a known outcome. Buffer is
+        # time-ordered, so one pass from the left suffices.
         cutoff = now - self.label_window
-        labeled = []
 
-        for ts, feat in self._buffer:
-            if ts <= cutoff:
-                label = 1 if feat["failure_ratio"] >= self.failure_threshold else 0
-                labeled.append((ts, feat, label))
+        while self._buffer and self._buffer[0][0] <= cutoff:
+            ts, feat = self._buffer.popleft()
+            label = 1 if feat["failure_ratio"] >= self.failure_threshold else 0
+            self._pending.append((
+                ts,
+                feat["failure_ratio"],
+                feat["failure_ratio_slope"],
+                feat["p95_latency"],
+                feat["latency_slope"],
+                feat["retry_rate"],
+                feat["timeout_rate"],
+                feat["error_burstiness"],
+                feat["circuit_flap_rate"],
+                label,
+            ))
+
+        # Flush in chunks — one writerows + one flush per batch instead of
+        # a write per row.
+        if self._pending and (
+            len(self._pending) >= self.flush_rows
+            or now - self._last_flush >= self.flush_interval
+        ):
+            self._flush(now)
 
-        # Remove labeled samples from buffer
-        self._buffer = [
-            (ts, feat) for ts, feat in self._buffer if ts > cutoff
-        ]
+    def _flush(self, now):
+        self._writer.writerows(self._pending)
+        self._fh.flush()
+        self._pending.clear()
+        self._last_flush = now
 
-        # Write labeled rows
-        with open(self.output_path, "a", newline="") as f:
-            writer = csv.writer(f)
-            for ts, feat, label in labeled:
-                writer.writerow([
-                    ts,
-                    feat["failure_ratio"],
-                    feat["failure_ratio_slope"],
-                    feat["p95_latency"],
-                    feat["latency_slope"],
-                    feat["retry_rate"],
-                    feat["timeout_rate"],
-                    feat["error_burstiness"],
-                    feat["circuit_flap_rate"],
-                    label,
-                ])
+    def close(self):
+        if self._pending:
+            self._flush(time.time())
+        self._fh.close()
@@ -1,18 +1,16 @@
-import joblib
-import threading
-import pandas as pd
+import math
+
+import numpy as np
 
 
 class FailureRiskPredictor:
     def __init__(self, model_path: str):
-        obj = joblib.load(model_path)
-
-        # Trained artifacts
-        self.model = obj["model"]
-        self.feature_names = obj["feature_names"]
+        # Plain NumPy archive — no joblib/pickle on the gateway import path
+        data = np.load(model_path, allow_pickle=False)
 
-        # Thread safety (FastAPI background tasks)
-        self._lock = threading.Lock()
+        self.feature_names = tuple(data["feature_names"].tolist())
+        self._w = np.asarray(data["coef"], dtype=np.float64)
+        self._b = float(data["intercept"][0])
 
     def predict_risk(self, features: dict) -> float:
         """
@@ -24,15 +22,14 @@ class FailureRiskPredictor:
 
         try:
             # Ensure correct feature order + names
-            row = [features.get(name, 0.0) for name in self.feature_names]
-
-            X = pd.DataFrame(
-                [row],
-                columns=self.feature_names
+            x = np.fromiter(
+                (features.get(name, 0.0) for name in self.feature_names),
+                dtype=np.float64,
+                count=len(self.feature_names),
             )
 
-            with self._lock:
-                return float(self.model.predict_proba(X)[0][1])
+            z = float(self._w @ x) + self._b
+            return 1.0 / (1.0 + math.exp(-z))
 
         except Exception:
             # Safety first — ML must never crash the gateway
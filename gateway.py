@@ -1,10 +1,34 @@
 from fastapi import FastAPI, Request, Response
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 import time
 import asyncio
-from collections import deque
-from prometheus_client import Counter, Histogram, Gauge, generate_latest
+import functools
+import random
+from prometheus_client import generate_latest
+
+from metrics import (
+    REQUEST_COUNT,
+    LATENCY,
+    UPSTREAM_TIMEOUTS,
+    UPSTREAM_5XX_ERRORS,
+    UPSTREAM_RETRIES,
+    UPSTREAM_RETRY_EXHAUSTED,
+    CIRCUIT_FAILURE_RATIO,
+    CIRCUIT_REQUESTS_TRACKED,
+    CIRCUIT_STATE,
+    CIRCUIT_OPEN_TOTAL,
+    CIRCUIT_SHORT_CIRCUITED,
+)
+
+try:
+    # libuv-backed event loop — pure win for an I/O-bound proxy
+    import uvloop
+    uvloop.install()
+except ImportError:
+    # uvloop is unavailable on Windows; fall back to asyncio's default loop
+    pass
 
 from features.extractor import FeatureExtractor
 from features.logger import FeatureLogger
@@ -12,15 +36,40 @@ from features.predictor import FailureRiskPredictor
 from features.adaptive import AdaptiveThresholdController
 
 
-app = FastAPI(title="PhantomAPI Gateway")
+app = FastAPI(title="PhantomAPI Gateway", default_response_class=ORJSONResponse)
 
 # -------------------- Config --------------------
 SERVICE_URL = "https://httpbin.org"
+# Parsed once — per-request URLs are derived via copy_with, which skips
+# re-parsing scheme/host/port from a string every call
+SERVICE_BASE_URL = httpx.URL(SERVICE_URL + "/")
 UPSTREAM_TIMEOUT_SECONDS = 2.0
 
+# Shared upstream client (created at startup, closed at shutdown)
+HTTP_CLIENT = None
+HTTP_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_connections=200)
+
 MAX_RETRIES = 2
 RETRY_BACKOFF_SECONDS = 0.2
+RETRY_BACKOFF_MAX_SECONDS = 2.0
 IDEMPOTENT_METHODS = {"GET", "HEAD"}
+BODYLESS_METHODS = {"GET", "HEAD"}
+
+# Inbound headers never forwarded upstream: Host plus the hop-by-hop set,
+# which httpx recomputes for the re-encoded request. ASGI header names are
+# lowercase bytes, so membership is a single hash per header.
+BLOCKED_HEADERS = frozenset({
+    b"host",
+    b"connection",
+    b"content-length",
+    b"transfer-encoding",
+    b"keep-alive",
+    b"proxy-authenticate",
+    b"proxy-authorization",
+    b"te",
+    b"trailers",
+    b"upgrade",
+})
 
 # -------------------- Circuit Breaker Config --------------------
 CIRCUIT_WINDOW_SIZE = 20
@@ -28,7 +77,11 @@ CIRCUIT_FAILURE_THRESHOLD = 0.5
 CIRCUIT_MIN_REQUESTS = 10
 CIRCUIT_OPEN_DURATION_SECONDS = 30
 
-failure_window = deque(maxlen=CIRCUIT_WINDOW_SIZE)
+# Sliding window packed into one int: bit i set = failure. Newest outcome
+# occupies bit 0; bit_count() is a C popcount, so the ratio is O(1).
+FAILURE_MASK = (1 << CIRCUIT_WINDOW_SIZE) - 1
+failure_bits = 0
+failure_len = 0
 
 circuit_state = "CLOSED"   # CLOSED | OPEN | HALF_OPEN
 circuit_opened_at = None
@@ -43,72 +96,43 @@ last_predictive_action = 0
 SOFT_RISK_THRESHOLD = 0.45
 HARD_RISK_THRESHOLD = 0.7
 
+# Risk/mode cache refreshed by the background controller; features only
+# change once per sample interval, so per-request recomputation is waste.
+current_risk = 0.0
+current_mode = "NORMAL"
+
 DEGRADED_TIMEOUT_SECONDS = 1.0
 DEGRADED_MAX_RETRIES = 0
 
 # -------------------- Metrics --------------------
-REQUEST_COUNT = Counter(
-    "api_requests_total",
-    "Total API requests",
-    ["endpoint", "method", "status"]
-)
-
-LATENCY = Histogram(
-    "api_request_latency_ms",
-    "API request latency",
-    ["endpoint"]
-)
-
-UPSTREAM_TIMEOUTS = Counter(
-    "upstream_timeouts_total",
-    "Upstream timeouts",
-    ["endpoint", "method"]
-)
+# Metric objects live in metrics.py; only the hot-path label caches are
+# defined here.
 
-UPSTREAM_5XX_ERRORS = Counter(
-    "upstream_5xx_errors_total",
-    "Upstream 5xx errors",
-    ["endpoint", "method"]
-)
+# Cached label children — labels() hashes and looks up the child on every
+# call, so amortize it per (endpoint, method) on the hot path.
+@functools.lru_cache(maxsize=4096)
+def _req_count(endpoint, method, status):
+    return REQUEST_COUNT.labels(endpoint, method, status)
 
-UPSTREAM_RETRIES = Counter(
-    "upstream_retries_total",
-    "Upstream retries",
-    ["endpoint", "method"]
-)
+@functools.lru_cache(maxsize=4096)
+def _latency(endpoint):
+    return LATENCY.labels(endpoint)
 
-UPSTREAM_RETRY_EXHAUSTED = Counter(
-    "upstream_retry_exhausted_total",
-    "Retries exhausted",
-    ["endpoint", "method"]
-)
+@functools.lru_cache(maxsize=4096)
+def _timeouts(endpoint, method):
+    return UPSTREAM_TIMEOUTS.labels(endpoint, method)
 
-CIRCUIT_FAILURE_RATIO = Histogram(
-    "circuit_failure_ratio",
-    "Circuit failure ratio"
-)
+@functools.lru_cache(maxsize=4096)
+def _5xx(endpoint, method):
+    return UPSTREAM_5XX_ERRORS.labels(endpoint, method)
 
-CIRCUIT_REQUESTS_TRACKED = Counter(
-    "circuit_requests_tracked_total",
-    "Requests tracked"
-)
+@functools.lru_cache(maxsize=4096)
+def _retries(endpoint, method):
+    return UPSTREAM_RETRIES.labels(endpoint, method)
 
-CIRCUIT_STATE = Gauge(
-    "circuit_state",
-    "Circuit state (0=closed,1=open,2=half_open)"
-)
-
-CIRCUIT_OPEN_TOTAL = Counter(
-    "circuit_open_total",
-    "Circuit opened count"
-)
-
-CIRCUIT_SHORT_CIRCUITED = Counter(
-    "circuit_short_circuited_total",
-    "Short-circuited requests"
-)
-
-CIRCUIT_STATE.set(0)
+@functools.lru_cache(maxsize=4096)
+def _retry_exhausted(endpoint, method):
+    return UPSTREAM_RETRY_EXHAUSTED.labels(endpoint, method)
 
 # -------------------- Feature Extractor --------------------
 feature_extractor = FeatureExtractor(
@@ -128,43 +152,83 @@ feature_logger = FeatureLogger(
 
 # -------------------- ML + Adaptive Threshold --------------------
 risk_predictor = FailureRiskPredictor(
-    model_path="experiments/models/failure_risk_model.joblib"
+    model_path="experiments/models/failure_risk_model.npz"
 )
 adaptive_controller = AdaptiveThresholdController()
 
 # -------------------- Startup --------------------
 @app.on_event("startup")
 async def start_background_tasks():
-    asyncio.create_task(feature_extractor.start())
-    asyncio.create_task(feature_logger.start())
-    asyncio.create_task(predictive_circuit_controller())
+    global HTTP_CLIENT
+    HTTP_CLIENT = httpx.AsyncClient(
+        timeout=UPSTREAM_TIMEOUT_SECONDS,
+        limits=HTTP_LIMITS,
+    )
+    asyncio.create_task(background_scheduler())
+
+@app.on_event("shutdown")
+async def close_http_client():
+    if HTTP_CLIENT is not None:
+        await HTTP_CLIENT.aclose()
 
 # -------------------- Predictive Circuit Controller --------------------
-async def predictive_circuit_controller():
+def predictive_step():
     global circuit_state, circuit_opened_at, last_predictive_action
+    global current_risk, current_mode
 
-    while True:
-        await asyncio.sleep(PREDICTIVE_CHECK_INTERVAL)
+    features = feature_extractor.compute_features()
+    risk = risk_predictor.predict_risk(features)
 
-        if circuit_state != "CLOSED":
-            continue
+    current_risk = risk
+    current_mode = request_mode_from_risk(risk)
 
-        now = time.time()
-        if now - last_predictive_action < PREDICTIVE_COOLDOWN:
-            continue
+    if circuit_state != "CLOSED":
+        return
 
-        features = feature_extractor.compute_features()
-        risk = risk_predictor.predict_risk(features)
-        threshold = adaptive_controller.compute_threshold(features)
+    now = time.time()
+    if now - last_predictive_action < PREDICTIVE_COOLDOWN:
+        return
 
-        if risk >= threshold:
-            circuit_state = "OPEN"
-            circuit_opened_at = time.time()
-            CIRCUIT_STATE.set(1)
-            CIRCUIT_OPEN_TOTAL.inc()
-            last_predictive_action = now
+    threshold = adaptive_controller.compute_threshold(features)
+
+    if risk >= threshold:
+        circuit_state = "OPEN"
+        circuit_opened_at = time.time()
+        CIRCUIT_STATE.set(1)
+        CIRCUIT_OPEN_TOTAL.inc()
+        last_predictive_action = now
+
+
+# -------------------- Background Scheduler --------------------
+async def background_scheduler():
+    # One timer for all periodic work: the logger (5 s) and predictive
+    # controller (5 s) intervals are exact multiples of the 1 s sampler.
+    tick = 0
+
+    while True:
+        await asyncio.sleep(feature_extractor.sample_interval)
+        tick += 1
+
+        feature_extractor.snapshot()
+
+        if tick % feature_logger.log_interval == 0:
+            # CSV flushes are blocking file I/O — keep them off the loop
+            await asyncio.to_thread(feature_logger.log_once)
+
+        if tick % PREDICTIVE_CHECK_INTERVAL == 0:
+            predictive_step()
 
 # -------------------- Helpers --------------------
+def retry_backoff(attempt):
+    # Exponential backoff with full jitter — keeps concurrent clients from
+    # retrying a recovering upstream in lockstep.
+    cap = min(
+        RETRY_BACKOFF_MAX_SECONDS,
+        RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)),
+    )
+    return random.uniform(0, cap)
+
+
 def request_mode_from_risk(risk: float):
     if risk >= HARD_RISK_THRESHOLD:
         return "HARD_FAIL"
@@ -173,11 +237,24 @@ def request_mode_from_risk(risk: float):
     return "NORMAL"
 
 
+def record_outcome(is_failure):
+    global failure_bits, failure_len
+
+    failure_bits = ((failure_bits << 1) | int(is_failure)) & FAILURE_MASK
+    failure_len = min(failure_len + 1, CIRCUIT_WINDOW_SIZE)
+
+
+def reset_failure_window():
+    global failure_bits, failure_len
+    failure_bits = 0
+    failure_len = 0
+
+
 def maybe_open_circuit():
     global circuit_state, circuit_opened_at, half_open_probe_in_flight
 
-    if len(failure_window) >= CIRCUIT_MIN_REQUESTS:
-        ratio = sum(failure_window) / len(failure_window)
+    if failure_len >= CIRCUIT_MIN_REQUESTS:
+        ratio = failure_bits.bit_count() / failure_len
         if ratio >= CIRCUIT_FAILURE_THRESHOLD and circuit_state == "CLOSED":
             circuit_state = "OPEN"
             circuit_opened_at = time.time()
@@ -190,9 +267,21 @@ def maybe_open_circuit():
 async def health():
     return {"status": "ok"}
 
+METRICS_CACHE_TTL_SECONDS = 1.0
+_metrics_cache = {"t": 0.0, "data": b""}
+
 @app.get("/metrics")
 async def metrics():
-    return PlainTextResponse(generate_latest())
+    # generate_latest walks the whole registry synchronously — keep that
+    # off the event loop, and serve overlapping scrapes (e.g. HA Prometheus
+    # pairs) from a short-TTL cache instead of re-walking the registry.
+    now = time.monotonic()
+    if now - _metrics_cache["t"] > METRICS_CACHE_TTL_SECONDS:
+        _metrics_cache["data"] = await asyncio.get_running_loop().run_in_executor(
+            None, generate_latest
+        )
+        _metrics_cache["t"] = now
+    return PlainTextResponse(_metrics_cache["data"])
 
 @app.get("/debug/features")
 async def debug_features():
@@ -219,13 +308,111 @@ async def debug_mode():
     }
 
 # -------------------- Proxy --------------------
+def _make_proxy(timeout, max_retries):
+    """Build a proxy coroutine with mode constants closed over.
+
+    One specialized body per mode means the hot loop never re-derives
+    timeout/max_retries from the current mode.
+    """
+
+    async def _proxy(path, ep, request):
+        global circuit_state, circuit_opened_at, half_open_probe_in_flight
+
+        url = SERVICE_BASE_URL.copy_with(path="/" + path)
+        method = request.method
+        # Skip the receive-channel walk entirely for bodyless methods;
+        # DELETE only counts as carrying a body if the client declared one.
+        if method in BODYLESS_METHODS or (
+            method == "DELETE"
+            and "content-length" not in request.headers
+            and "transfer-encoding" not in request.headers
+        ):
+            body = None
+        else:
+            body = await request.body()
+        headers = [
+            (k, v) for k, v in request.headers.raw if k not in BLOCKED_HEADERS
+        ]
+
+        attempts = 0
+        start_ns = time.monotonic_ns()
+
+        while True:
+            try:
+                req = HTTP_CLIENT.build_request(
+                    method, url, headers=headers, content=body, timeout=timeout
+                )
+                resp = await HTTP_CLIENT.send(req, stream=True)
+
+                _latency(ep).observe((time.monotonic_ns() - start_ns) / 1_000_000)
+                _req_count(ep, method, resp.status_code).inc()
+
+                is_failure = 500 <= resp.status_code < 600
+                record_outcome(is_failure)
+                CIRCUIT_REQUESTS_TRACKED.inc()
+
+                if circuit_state == "HALF_OPEN" and not is_failure:
+                    circuit_state = "CLOSED"
+                    half_open_probe_in_flight = False
+                    circuit_opened_at = None
+                    reset_failure_window()
+                    CIRCUIT_STATE.set(0)
+
+                if is_failure:
+                    _5xx(ep, method).inc()
+                    maybe_open_circuit()
+
+                    if method in IDEMPOTENT_METHODS and attempts < max_retries:
+                        attempts += 1
+                        _retries(ep, method).inc()
+                        await resp.aclose()
+                        await asyncio.sleep(retry_backoff(attempts))
+                        continue
+
+                # Stream the body through instead of buffering it — memory
+                # stays constant regardless of payload size.
+                return StreamingResponse(
+                    resp.aiter_bytes(),
+                    status_code=resp.status_code,
+                    media_type=resp.headers.get("content-type"),
+                    background=BackgroundTask(resp.aclose),
+                )
+
+            except httpx.TimeoutException:
+                _timeouts(ep, method).inc()
+                record_outcome(True)
+                CIRCUIT_REQUESTS_TRACKED.inc()
+                maybe_open_circuit()
+
+                if method in IDEMPOTENT_METHODS and attempts < max_retries:
+                    attempts += 1
+                    _retries(ep, method).inc()
+                    await asyncio.sleep(retry_backoff(attempts))
+                    continue
+
+                _retry_exhausted(ep, method).inc()
+                return Response(b"Upstream timeout", status_code=504)
+
+    return _proxy
+
+
+_PROXY = {
+    "NORMAL": _make_proxy(UPSTREAM_TIMEOUT_SECONDS, MAX_RETRIES),
+    "DEGRADED": _make_proxy(DEGRADED_TIMEOUT_SECONDS, DEGRADED_MAX_RETRIES),
+}
+
+
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "HEAD"])
 async def proxy(path: str, request: Request):
-    global circuit_state, circuit_opened_at, half_open_probe_in_flight
+    global circuit_state, half_open_probe_in_flight
 
     if path in ["health", "metrics", "debug"]:
         return Response(status_code=404)
 
+    # Label by route template, not raw path — unbounded paths would blow up
+    # label cardinality (and the child caches) in Prometheus.
+    route = request.scope.get("route")
+    ep = getattr(route, "path", "/{path:path}")
     now = time.time()
 
     # ----- Circuit enforcement -----
@@ -235,7 +422,7 @@ async def proxy(path: str, request: Request):
             CIRCUIT_STATE.set(2)
         else:
             CIRCUIT_SHORT_CIRCUITED.inc()
-            REQUEST_COUNT.labels(f"/{path}", request.method, 503).inc()
+            _req_count(ep, request.method, 503).inc()
             return Response(b"Circuit open", status_code=503)
 
     if circuit_state == "HALF_OPEN":
@@ -244,76 +431,11 @@ async def proxy(path: str, request: Request):
             return Response(b"Half-open probe in progress", status_code=503)
         half_open_probe_in_flight = True
 
-    # ----- Phase 3.5 Risk-based behavior -----
-    features = feature_extractor.compute_features()
-    risk = risk_predictor.predict_risk(features)
-    mode = request_mode_from_risk(risk)
+    # ----- Phase 3.5 Risk-based behavior (cached by background controller) -----
+    mode = current_mode
 
     if mode == "HARD_FAIL":
         CIRCUIT_SHORT_CIRCUITED.inc()
         return Response(b"Service temporarily degraded", status_code=429)
 
-    timeout = UPSTREAM_TIMEOUT_SECONDS
-    max_retries = MAX_RETRIES
-
-    if mode == "DEGRADED":
-        timeout = DEGRADED_TIMEOUT_SECONDS
-        max_retries = DEGRADED_MAX_RETRIES
-
-    url = f"{SERVICE_URL}/{path}"
-    method = request.method
-    body = await request.body()
-    headers = {k: v for k, v in request.headers.items() if k.lower() != "host"}
-
-    attempts = 0
-    start = time.time()
-
-    while True:
-        try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                resp = await client.request(method, url, headers=headers, content=body)
-
-            LATENCY.labels(f"/{path}").observe((time.time() - start) * 1000)
-            REQUEST_COUNT.labels(f"/{path}", method, resp.status_code).inc()
-
-            is_failure = 500 <= resp.status_code < 600
-            failure_window.append(is_failure)
-            CIRCUIT_REQUESTS_TRACKED.inc()
-
-            if circuit_state == "HALF_OPEN" and not is_failure:
-                circuit_state = "CLOSED"
-                half_open_probe_in_flight = False
-                circuit_opened_at = None
-                failure_window.clear()
-                CIRCUIT_STATE.set(0)
-
-            if is_failure:
-                UPSTREAM_5XX_ERRORS.labels(f"/{path}", method).inc()
-                maybe_open_circuit()
-
-                if method in IDEMPOTENT_METHODS and attempts < max_retries:
-                    attempts += 1
-                    UPSTREAM_RETRIES.labels(f"/{path}", method).inc()
-                    await asyncio.sleep(RETRY_BACKOFF_SECONDS * attempts)
-                    continue
-
-            return Response(
-                content=resp.content,
-                status_code=resp.status_code,
-                media_type=resp.headers.get("content-type"),
-            )
-
-        except httpx.TimeoutException:
-            UPSTREAM_TIMEOUTS.labels(f"/{path}", method).inc()
-            failure_window.append(True)
-            CIRCUIT_REQUESTS_TRACKED.inc()
-            maybe_open_circuit()
-
-            if method in IDEMPOTENT_METHODS and attempts < max_retries:
-                attempts += 1
-                UPSTREAM_RETRIES.labels(f"/{path}", method).inc()
-                await asyncio.sleep(RETRY_BACKOFF_SECONDS * attempts)
-                continue
-
-            UPSTREAM_RETRY_EXHAUSTED.labels(f"/{path}", method).inc()
-            return Response(b"Upstream timeout", status_code=504)
+    return await _PROXY[mode](path, ep, request)
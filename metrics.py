@@ -1,10 +1,68 @@
-from fastapi import FastAPI, Response
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram, Gauge
 
-REQUEST_COUNT = Counter("phantomapi_requests_total", "Total API Requests", ["method", "endpoint", "status"])
-REQUEST_LATENCY = Histogram("phantomapi_request_latency_ms", "Request latency in ms", ["endpoint"])
+# Single home for every Prometheus metric the gateway exports. Defining
+# these in one module keeps collectors from being registered twice when
+# another module needs a handle on them.
 
-def setup_metrics(app: FastAPI):
-    @app.get("/metrics")
-    async def metrics():
-        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+REQUEST_COUNT = Counter(
+    "api_requests_total",
+    "Total API requests",
+    ["endpoint", "method", "status"]
+)
+
+LATENCY = Histogram(
+    "api_request_latency_ms",
+    "API request latency",
+    ["endpoint"]
+)
+
+UPSTREAM_TIMEOUTS = Counter(
+    "upstream_timeouts_total",
+    "Upstream timeouts",
+    ["endpoint", "method"]
+)
+
+UPSTREAM_5XX_ERRORS = Counter(
+    "upstream_5xx_errors_total",
+    "Upstream 5xx errors",
+    ["endpoint", "method"]
+)
+
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Upstream retries",
+    ["endpoint", "method"]
+)
+
+UPSTREAM_RETRY_EXHAUSTED = Counter(
+    "upstream_retry_exhausted_total",
+    "Retries exhausted",
+    ["endpoint", "method"]
+)
+
+CIRCUIT_FAILURE_RATIO = Histogram(
+    "circuit_failure_ratio",
+    "Circuit failure ratio"
+)
+
+CIRCUIT_REQUESTS_TRACKED = Counter(
+    "circuit_requests_tracked_total",
+    "Requests tracked"
+)
+
+CIRCUIT_STATE = Gauge(
+    "circuit_state",
+    "Circuit state (0=closed,1=open,2=half_open)"
+)
+
+CIRCUIT_OPEN_TOTAL = Counter(
+    "circuit_open_total",
+    "Circuit opened count"
+)
+
+CIRCUIT_SHORT_CIRCUITED = Counter(
+    "circuit_short_circuited_total",
+    "Short-circuited requests"
+)
+
+CIRCUIT_STATE.set(0)